@@ -13,6 +13,11 @@ import yt_dlp
 import schedule
 from datetime import datetime
 from insta_uploader import upload_to_instagram
+from proxy_pool import load_proxy_pool
+from range_downloader import accelerated_download, DOWNLOAD_CONNECTIONS
+from profiler import profiled, install_signal_handler
+from video_fingerprint import FingerprintIndex, set_aside_duplicate
+from chrome_profile import ChromeProfile, is_error_page
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -21,6 +26,7 @@ load_dotenv()
 # Constants
 VIDEOS_DIR = "videos"
 TRACKED_URLS_FILE = "tracked_urls.json"
+FINGERPRINT_INDEX_FILE = "fingerprints.json"
 TIKTOK_PROFILE = os.getenv("TIKTOK_PROFILE")
 INSTA_USERNAME = os.getenv("INSTA_USERNAME")
 INSTA_PASSWORD = os.getenv("INSTA_PASSWORD")
@@ -31,6 +37,11 @@ if not INSTA_USERNAME or not INSTA_PASSWORD:
 if not TIKTOK_PROFILE:
     raise ValueError("TikTok profile URL not found in environment variables!")
 
+proxy_pool = load_proxy_pool()
+PROXY_KEY = f"bot:{TIKTOK_PROFILE}"  # Sticky egress for this bot's Chrome profile
+fingerprint_index = FingerprintIndex(FINGERPRINT_INDEX_FILE)
+chrome_profile = ChromeProfile(TIKTOK_PROFILE, "bot")
+
 def ensure_directory_exists():
     if not os.path.exists(VIDEOS_DIR):
         os.makedirs(VIDEOS_DIR)
@@ -45,12 +56,17 @@ def save_tracked_urls(urls_data):
     with open(TRACKED_URLS_FILE, 'w') as f:
         json.dump(urls_data, f, indent=4)
 
+@profiled("download_video")
 def download_video(url):
     ydl_opts = {
         'format': 'best',
         'outtmpl': os.path.join(VIDEOS_DIR, '%(id)s.%(ext)s'),
         'quiet': False,  # Enable output for debugging
         'no_warnings': False,
+        'concurrent_fragment_downloads': DOWNLOAD_CONNECTIONS,
+        'continuedl': True,
+        'retries': 3,
+        'fragment_retries': 3,
         'extractor_args': {
             'tiktok': {
                 'download_timeout': 30,
@@ -67,12 +83,24 @@ def download_video(url):
         }
     }
     
+    # Downloads aren't tied to the Chrome session, spread them over the pool
+    proxy = proxy_pool.next()
+    if proxy:
+        ydl_opts['proxy'] = proxy
+    
+    start_time = time.time()
+    latency = None
+    success = False
     try:
         # First try with yt-dlp's built-in extractor
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             try:
-                info = ydl.extract_info(url, download=True)
-                return True
+                info = ydl.extract_info(url, download=False)
+                # Score the proxy on extraction only, download time grows with clip size
+                latency = time.time() - start_time
+                if not accelerated_download(ydl, info, proxy):
+                    ydl.process_ie_result(info, download=True)
+                success = True
             except Exception as e:
                 print(f"First attempt failed: {e}")
                 
@@ -80,16 +108,19 @@ def download_video(url):
                 ydl_opts['format'] = 'bestvideo*+bestaudio/best'
                 try:
                     info = ydl.extract_info(url, download=True)
-                    return True
+                    success = True
                 except Exception as e:
                     print(f"Second attempt failed: {e}")
-                    return False
                     
     except Exception as e:
         print(f"Error downloading {url}: {e}")
-        return False
+    
+    if latency is None:
+        latency = time.time() - start_time
+    proxy_pool.report(proxy, success, latency)
+    return success
 
-def setup_chrome_options():
+def setup_chrome_options(proxy=None):
     options = uc.ChromeOptions()
     
     # Basic settings
@@ -100,6 +131,12 @@ def setup_chrome_options():
     options.add_argument('--disable-setuid-sandbox')
     options.add_argument('--single-process')
     
+    if proxy:
+        options.add_argument(f'--proxy-server={proxy}')
+    
+    # Persistent profile so cookies and cached JS survive between runs
+    chrome_profile.apply(options)
+    
     # Additional settings for Heroku
     if os.getenv('DYNO'):
         options.binary_location = "/app/.apt/usr/bin/chromium-browser"
@@ -110,9 +147,10 @@ def setup_chrome_options():
     
     return options
 
-def create_stealth_driver():
+def create_stealth_driver(proxy=None):
+    fresh_profile = chrome_profile.is_fresh()
     try:
-        options = setup_chrome_options()
+        options = setup_chrome_options(proxy)
         if os.getenv('DYNO'):  # If on Heroku
             chrome_driver_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'drivers', 'chromedriver')
             driver = uc.Chrome(
@@ -127,10 +165,14 @@ def create_stealth_driver():
         # Add error checking
         if not driver:
             raise Exception("Failed to create Chrome driver")
+        
+        if fresh_profile:
+            chrome_profile.restore_cookies(driver, "https://www.tiktok.com/")
             
         return driver
     except Exception as e:
         print(f"Error creating Chrome driver: {e}")
+        chrome_profile.report(False, launch_failed=True)
         if os.getenv('DYNO'):
             print("Chrome binary location:", options.binary_location)
             print("ChromeDriver path:", chrome_driver_path)
@@ -158,6 +200,7 @@ def get_video_urls(driver, num_videos=10):
         print(f"Error getting video URLs: {e}")
         return []
 
+@profiled("process_new_videos")
 def process_new_videos(video_urls):
     if not video_urls:
         print("No videos to process")
@@ -185,11 +228,21 @@ def process_new_videos(video_urls):
             save_tracked_urls(tracked_data)
             successful_downloads += 1
             print("Download successful")
+            
+            # Keep near-duplicates of videos we already have away from the uploader
+            video_id = url.split('/')[-1]
+            video_path = os.path.join(VIDEOS_DIR, f"{video_id}.mp4")
+            if os.path.exists(video_path):
+                original = fingerprint_index.check_duplicate(video_id, video_path)
+                if original:
+                    print(f"Video {video_id} is a near-duplicate of {original}, skipping upload")
+                    print(f"Moved to {set_aside_duplicate(video_path)}")
         else:
             print("Download failed")
     
     print(f"\nDownloaded {successful_downloads} out of {len(new_urls)} new videos")
 
+@profiled("visit_tiktok_profile")
 def visit_tiktok_profile():
     max_retries = 50000000
     current_retry = 0
@@ -200,11 +253,14 @@ def visit_tiktok_profile():
             print(f"\nRetry attempt {current_retry}/{max_retries}...")
             time.sleep(random.uniform(3, 6))
             
-        driver = create_stealth_driver()
+        proxy = proxy_pool.get(PROXY_KEY)
+        driver = create_stealth_driver(proxy)
         
+        time.sleep(random.uniform(2, 4))
+        start_time = time.time()
         try:
-            time.sleep(random.uniform(2, 4))
             driver.get(TIKTOK_PROFILE)
+            load_time = time.time() - start_time
             time.sleep(3)
             
             for _ in range(3):
@@ -221,8 +277,14 @@ def visit_tiktok_profile():
             else:
                 print("No video URLs found in this attempt")
             
+            proxy_pool.report(proxy, bool(video_urls), load_time)
+            # No posts on a page that did load is what a flagged profile looks like
+            chrome_profile.report(bool(video_urls), driver, network_error=not video_urls and is_error_page(driver))
+            
         except Exception as e:
             print(f"An error occurred: {e}")
+            proxy_pool.report(proxy, False, time.time() - start_time)
+            chrome_profile.report(False, network_error=True)
             
         finally:
             try:
@@ -237,6 +299,7 @@ def visit_tiktok_profile():
     
     return video_urls
 
+@profiled("job")
 def job():
     print("\nStarting scheduled job...")
     ensure_directory_exists()
@@ -253,6 +316,8 @@ def job():
     print("Job completed")
 
 def main():
+    install_signal_handler()
+    
     # Run job immediately once
     job()
     
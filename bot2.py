@@ -19,6 +19,12 @@ from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaFileUpload
 from googleapiclient.errors import HttpError
+from proxy_pool import load_proxy_pool
+from range_downloader import accelerated_download, DOWNLOAD_CONNECTIONS
+from profiler import profiled, install_signal_handler
+from video_fingerprint import FingerprintIndex, set_aside_duplicate
+from chrome_profile import ChromeProfile, is_error_page
+from upload_queue import UploadQueue, video_created_time
 
 # Load environment variables
 load_dotenv()
@@ -27,6 +33,10 @@ load_dotenv()
 VIDEOS_DIR = "videos_bot2"  # Different directory to avoid conflicts with bot.py
 TRACKED_URLS_FILE = "tracked_urls_bot2.json"
 UPLOADED_VIDEOS_FILE = "uploaded_videos_bot2.json"
+FINGERPRINT_INDEX_FILE = "fingerprints_bot2.json"
+UPLOAD_QUEUE_FILE = "upload_queue_bot2.jsonl"
+UPLOAD_INTERVAL = 900  # Seconds between consecutive YouTube uploads
+UPLOAD_BATCH_SIZE = 8  # Uploads per job, the rest waits so the next scrape can queue fresh videos ahead of it
 TIKTOK_PROFILE = os.getenv("TIKTOK_PROFILE2")
 QUOTA_RESET_HOUR = 7  # YouTube quota resets at midnight Pacific Time (7 AM UTC)
 MAX_RETRIES = 4
@@ -40,6 +50,12 @@ CREDENTIALS_PICKLE_FILE = 'youtube_token.pickle'
 if not TIKTOK_PROFILE:
     raise ValueError("TikTok profile URL not found in environment variables (TIKTOK_PROFILE2)!")
 
+proxy_pool = load_proxy_pool()
+PROXY_KEY = f"bot2:{TIKTOK_PROFILE}"  # Sticky egress for this bot's Chrome profile
+fingerprint_index = FingerprintIndex(FINGERPRINT_INDEX_FILE)
+chrome_profile = ChromeProfile(TIKTOK_PROFILE, "bot2")
+upload_queue = UploadQueue(UPLOAD_QUEUE_FILE)
+
 def ensure_directory_exists():
     if not os.path.exists(VIDEOS_DIR):
         os.makedirs(VIDEOS_DIR)
@@ -54,12 +70,17 @@ def save_tracked_urls(urls_data):
     with open(TRACKED_URLS_FILE, 'w') as f:
         json.dump(urls_data, f, indent=4)
 
+@profiled("download_video")
 def download_video(url):
     ydl_opts = {
         'format': 'best',
         'outtmpl': os.path.join(VIDEOS_DIR, '%(id)s.%(ext)s'),
         'quiet': False,
         'no_warnings': False,
+        'concurrent_fragment_downloads': DOWNLOAD_CONNECTIONS,
+        'continuedl': True,
+        'retries': 3,
+        'fragment_retries': 3,
         'extractor_args': {
             'tiktok': {
                 'download_without_watermark': True,
@@ -68,13 +89,26 @@ def download_video(url):
         }
     }
     
+    # Downloads aren't tied to the Chrome session, spread them over the pool
+    proxy = proxy_pool.next()
+    if proxy:
+        ydl_opts['proxy'] = proxy
+    
+    start_time = time.time()
+    latency = None
     try:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
+            info = ydl.extract_info(url, download=False)
+            # Score the proxy on extraction only, download time grows with clip size
+            latency = time.time() - start_time
+            if not accelerated_download(ydl, info, proxy):
+                ydl.process_ie_result(info, download=True)
             print(f"Successfully downloaded: {url}")
+            proxy_pool.report(proxy, True, latency)
             return True
     except Exception as e:
         print(f"Error downloading video {url}: {e}")
+        proxy_pool.report(proxy, False, latency if latency is not None else time.time() - start_time)
         return False
 
 def setup_chrome_options():
@@ -88,19 +122,28 @@ def setup_chrome_options():
     chrome_options.add_argument('--disable-features=VizDisplayCompositor')
     return chrome_options
 
-def create_stealth_driver():
+def create_stealth_driver(proxy=None):
     options = uc.ChromeOptions()
     options.add_argument('--headless')
     options.add_argument('--no-sandbox')
     options.add_argument('--disable-dev-shm-usage')
     options.add_argument('--disable-gpu')
     options.add_argument('--window-size=1920x1080')
+    if proxy:
+        options.add_argument(f'--proxy-server={proxy}')
+    
+    # Persistent profile so cookies and cached JS survive between runs
+    fresh_profile = chrome_profile.is_fresh()
+    chrome_profile.apply(options)
     
     try:
         driver = uc.Chrome(options=options, version_main=131)
+        if fresh_profile:
+            chrome_profile.restore_cookies(driver, "https://www.tiktok.com/")
         return driver
     except Exception as e:
         print(f"Error creating driver: {e}")
+        chrome_profile.report(False, launch_failed=True)
         return None
 
 def get_video_urls(driver, num_videos=100):
@@ -162,6 +205,7 @@ def wait_for_quota_reset():
     print(f"Quota exceeded. Waiting until next reset at {next_reset} UTC")
     time.sleep(wait_seconds)
 
+@profiled("upload_to_youtube")
 def upload_to_youtube(video_file):
     if not os.path.exists(video_file):
         print(f"Video file not found: {video_file}")
@@ -232,6 +276,19 @@ def upload_to_youtube(video_file):
     
     return False
 
+def skip_if_duplicate(video_id, video_path):
+    original = fingerprint_index.check_duplicate(video_id, video_path)
+    if original:
+        print(f"Video {video_id} is a near-duplicate of {original}, skipping upload")
+        print(f"Moved to {set_aside_duplicate(video_path)}")
+        return True
+    return False
+
+def enqueue_upload(url):
+    video_id = url.split('/')[-1]
+    return upload_queue.push(video_id, video_created_time(video_id), {"url": url})
+
+@profiled("process_new_videos")
 def process_new_videos(video_urls):
     tracked_urls = load_tracked_urls()
     downloaded_urls = tracked_urls["downloaded_urls"]
@@ -247,25 +304,12 @@ def process_new_videos(video_urls):
                 save_tracked_urls(tracked_urls)
                 print(f"Successfully downloaded video: {url}")
                 
-                # Find the downloaded video file
-                for filename in os.listdir(VIDEOS_DIR):
-                    if filename.endswith(('.mp4', '.webm')):
-                        video_path = os.path.join(VIDEOS_DIR, filename)
-                        
-                        # Check if video was already uploaded
-                        if os.path.exists(UPLOADED_VIDEOS_FILE):
-                            with open(UPLOADED_VIDEOS_FILE, 'r') as f:
-                                uploaded_videos = json.load(f)
-                        else:
-                            uploaded_videos = []
-                        
-                        if video_path not in uploaded_videos:
-                            print(f"Uploading to YouTube: {video_path}")
-                            if upload_to_youtube(video_path):
-                                print("Waiting 30 minutes before next operation...")
-                                time.sleep(900)  # Wait 30 minutes
-                            else:
-                                print("YouTube upload failed, will retry next time")
+                video_id = url.split('/')[-1]
+                video_path = os.path.join(VIDEOS_DIR, f"{video_id}.mp4")
+                if os.path.exists(video_path) and skip_if_duplicate(video_id, video_path):
+                    continue
+                
+                enqueue_upload(url)
             else:
                 print(f"Failed to download video: {url}")
     
@@ -285,20 +329,29 @@ def get_unuploaded_videos():
     # Get video IDs from uploaded videos
     uploaded_ids = set(os.path.splitext(os.path.basename(v))[0] for v in uploaded_videos)
     
-    # Find URLs that haven't been uploaded
+    # Find URLs that haven't been uploaded and make sure they are queued
     unuploaded_urls = []
     for url in tracked_urls:
         video_id = url.split('/')[-1]
-        if video_id not in uploaded_ids:
+        if video_id not in uploaded_ids and video_id not in fingerprint_index.duplicates:
             unuploaded_urls.append(url)
+            enqueue_upload(url)
     
     return unuploaded_urls
 
-def process_unuploaded_videos(unuploaded_urls):
+@profiled("process_unuploaded_videos")
+def process_unuploaded_videos():
     videos_processed = 0
     
-    for url in unuploaded_urls:
-        video_id = url.split('/')[-1]
+    uploads = 0
+    
+    # Take a batch off the queue by priority, so fresh videos don't wait behind an old backlog
+    while uploads < UPLOAD_BATCH_SIZE:
+        item = upload_queue.pop()
+        if item is None:
+            break
+        url = item["data"]["url"]
+        video_id = item["id"]
         video_path = os.path.join(VIDEOS_DIR, f"{video_id}.mp4")
         
         # If video doesn't exist locally, download it
@@ -308,31 +361,52 @@ def process_unuploaded_videos(unuploaded_urls):
                 print(f"Failed to download video: {url}")
                 continue
         
+        if skip_if_duplicate(video_id, video_path):
+            upload_queue.ack(video_id)
+            continue
+        
+        # Only wait once there is another video to upload
+        if uploads:
+            print(f"Waiting {UPLOAD_INTERVAL // 60} minutes before next upload...")
+            time.sleep(UPLOAD_INTERVAL)
+        uploads += 1
+        
         # Upload to YouTube
         print(f"Uploading to YouTube: {video_path}")
         if upload_to_youtube(video_path):
+            upload_queue.ack(video_id)
             videos_processed += 1
             print(f"Successfully uploaded: {video_path}")
         else:
+            # Left unacked, so it's handed out again on the next run
             print(f"Failed to upload: {video_path}")
     
+    if len(upload_queue):
+        print(f"{len(upload_queue)} videos left for the next job")
+    
     return videos_processed
 
+@profiled("visit_tiktok_profile")
 def visit_tiktok_profile():
     print(f"\nStarting TikTok profile visit at {datetime.now()}")
     driver = None
+    proxy = proxy_pool.get(PROXY_KEY)
     
     try:
-        driver = create_stealth_driver()
+        driver = create_stealth_driver(proxy)
         if not driver:
             print("Failed to create driver")
             return
         
         try:
             time.sleep(random.uniform(2, 4))
+            start_time = time.time()
             driver.get(TIKTOK_PROFILE)
+            load_time = time.time() - start_time
             time.sleep(3)
             
+            video_urls = []
+            
             for _ in range(3):
                 try:
                     video_urls = get_video_urls(driver)
@@ -343,6 +417,10 @@ def visit_tiktok_profile():
                     print(f"Error getting video URLs (attempt {_ + 1}): {e}")
                     time.sleep(2)
             
+            proxy_pool.report(proxy, bool(video_urls), load_time)
+            # No posts on a page that did load is what a flagged profile looks like
+            chrome_profile.report(bool(video_urls), driver, network_error=not video_urls and is_error_page(driver))
+            
             if video_urls:
                 new_videos = process_new_videos(video_urls)
                 print(f"Downloaded {new_videos} new videos")
@@ -351,6 +429,8 @@ def visit_tiktok_profile():
                 
         except Exception as e:
             print(f"Error during TikTok profile visit: {e}")
+            proxy_pool.report(proxy, False, 0)
+            chrome_profile.report(False, network_error=True)
             
     finally:
         if driver:
@@ -358,25 +438,25 @@ def visit_tiktok_profile():
     
     print("Profile visit completed")
 
+@profiled("job")
 def job():
     print(f"\nStarting job at {datetime.now()}")
     ensure_directory_exists()
     
-    # First check for any unuploaded videos from previously tracked URLs
-    unuploaded_urls = get_unuploaded_videos()
-    if unuploaded_urls:
-        print(f"Found {len(unuploaded_urls)} unuploaded videos from previous tracking. Processing these first...")
-        videos_processed = process_unuploaded_videos(unuploaded_urls)
-        print(f"Processed {videos_processed} videos")
-        if videos_processed > 0:
-            print("Waiting 5 minutes before searching for new videos...")
-            time.sleep(300)  # Wait 5 minutes
-    
-    # Proceed with finding new videos
+    # Find new videos first so they can be queued ahead of the backlog
     print("Searching for new videos...")
     visit_tiktok_profile()
+    
+    # Queue any unuploaded videos from previously tracked URLs
+    unuploaded_urls = get_unuploaded_videos()
+    if len(upload_queue):
+        print(f"{len(upload_queue)} videos waiting for upload ({len(unuploaded_urls)} from previous tracking)")
+        videos_processed = process_unuploaded_videos()
+        print(f"Processed {videos_processed} videos")
 
 def main():
+    install_signal_handler()
+    
     # Run job immediately once
     job()
     
@@ -0,0 +1,226 @@
+import os
+import re
+import json
+import time
+import shutil
+import socket
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+CHROME_PROFILES_DIR = os.getenv("CHROME_PROFILES_DIR", "chrome_profiles")
+CHROME_CACHE_MB = int(os.getenv("CHROME_CACHE_MB", "100"))
+MAX_PROFILE_MB = int(os.getenv("CHROME_MAX_PROFILE_MB", "500"))
+MAX_PROFILE_FAILURES = int(os.getenv("CHROME_MAX_PROFILE_FAILURES", "5"))
+MAX_LAUNCH_FAILURES = int(os.getenv("CHROME_MAX_LAUNCH_FAILURES", "3"))
+STATE_FILE = "profile_state.json"
+COOKIES_FILE = "cookies.json"
+# Left behind by a Chrome that didn't shut down cleanly, they block the next launch
+LOCK_FILES = ["SingletonLock", "SingletonSocket", "SingletonCookie"]
+
+
+def is_stale_lock(lock_path):
+    """True if SingletonLock belongs to a Chrome process that no longer runs.
+
+    The lock is a symlink to "<hostname>-<pid>" of the owning browser. Locks
+    that can't be read, or that come from another host, are left alone.
+    """
+    try:
+        target = os.readlink(lock_path)
+    except OSError:
+        return False
+    hostname, _, pid = target.rpartition('-')
+    if hostname != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False
+    return False
+
+
+def is_error_page(driver):
+    """True if Chrome shows its own network error page, e.g. for a dead proxy, instead of the site."""
+    try:
+        return driver.current_url.startswith("chrome-error://") or bool(driver.execute_script(
+            "return !!document.body && document.body.classList.contains('neterror')"))
+    except Exception:
+        return True
+
+
+def get_dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ChromeProfile:
+    """Persistent Chrome user-data-dir for one TikTok profile.
+
+    The directory keeps cookies and a size-capped HTTP disk cache between runs
+    so polls don't re-download TikTok's JS bundles or start as a brand new
+    visitor. After MAX_PROFILE_FAILURES visits in a row where the page loaded
+    but showed no posts the profile is treated as flagged and deleted. Network
+    and driver errors are counted separately and never rotate the profile,
+    those come from the egress proxy, which ProxyPool quarantines. After MAX_LAUNCH_FAILURES failed launches
+    in a row it is treated as corrupted and rebuilt, keeping the cookie backup.
+    A single failure, e.g. a chromedriver mismatch, never wipes the cache.
+
+    report() only marks the profile for rotation, the directory is deleted by
+    prepare() before the next launch, once no Chrome is using it anymore.
+    """
+
+    def __init__(self, profile_url, namespace, base_dir=CHROME_PROFILES_DIR):
+        name = re.sub(r'[^A-Za-z0-9_.@-]+', '_', profile_url.rstrip('/').split('/')[-1]) or "default"
+        # Namespaced per bot so two bots tracking the same creator never share a user-data-dir
+        self.path = os.path.abspath(os.path.join(base_dir, namespace, name))
+        self.data_dir = os.path.join(self.path, "user_data")
+        self.cache_dir = os.path.join(self.path, "cache")
+        self.state_path = os.path.join(self.path, STATE_FILE)
+        self.cookies_path = os.path.join(self.path, COOKIES_FILE)
+
+    def load_state(self):
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, 'r') as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"Error loading Chrome profile state: {e}")
+        return {"created": time.time(), "failures": 0, "launch_failures": 0, "network_errors": 0, "visits": 0}
+
+    def save_state(self, state):
+        with open(self.state_path, 'w') as f:
+            json.dump(state, f, indent=4)
+
+    def prepare(self):
+        lock_path = os.path.join(self.data_dir, LOCK_FILES[0])
+        unlocked = not os.path.lexists(lock_path) or is_stale_lock(lock_path)
+
+        rotation = self.load_state().get("rotate") if os.path.exists(self.state_path) else None
+        if rotation:
+            if unlocked:
+                self.rotate(rotation["reason"], rotation["keep_cookies"])
+            else:
+                print(f"Chrome profile {self.path} is still in use, postponing rotation")
+
+        for path in (self.data_dir, self.cache_dir):
+            if not os.path.exists(path):
+                os.makedirs(path)
+
+        if unlocked:
+            for name in LOCK_FILES:
+                path = os.path.join(self.data_dir, name)
+                if os.path.lexists(path):
+                    print(f"Removing stale Chrome lock: {path}")
+                    os.remove(path)
+
+        # Chrome caps the HTTP cache itself, this catches everything else that grows
+        if get_dir_size(self.path) > MAX_PROFILE_MB * 1024 * 1024:
+            print(f"Chrome profile exceeds {MAX_PROFILE_MB} MB, clearing cache")
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            os.makedirs(self.cache_dir)
+
+    def apply(self, options):
+        self.prepare()
+        options.add_argument(f'--user-data-dir={self.data_dir}')
+        options.add_argument(f'--disk-cache-dir={self.cache_dir}')
+        options.add_argument(f'--disk-cache-size={CHROME_CACHE_MB * 1024 * 1024}')
+
+    def is_fresh(self):
+        return not os.path.exists(os.path.join(self.data_dir, "Default"))
+
+    def save_cookies(self, driver):
+        try:
+            with open(self.cookies_path, 'w') as f:
+                json.dump(driver.get_cookies(), f, indent=4)
+        except Exception as e:
+            print(f"Error saving cookies: {e}")
+
+    def restore_cookies(self, driver, url):
+        """Load the cookie backup into a fresh profile, e.g. after a corrupted one was rebuilt."""
+        if not os.path.exists(self.cookies_path):
+            return
+        try:
+            with open(self.cookies_path, 'r') as f:
+                cookies = json.load(f)
+            # Cookies can only be set for the domain that's currently open
+            driver.get(url)
+            for cookie in cookies:
+                cookie.pop('sameSite', None)
+                try:
+                    driver.add_cookie(cookie)
+                except Exception:
+                    pass
+            print(f"Restored {len(cookies)} cookies")
+        except Exception as e:
+            print(f"Error restoring cookies: {e}")
+
+    def report(self, success, driver=None, launch_failed=False, network_error=False):
+        """Record a visit or launch result, marking the profile for rotation after repeated failures.
+
+        Pass network_error=True for visits that failed before TikTok answered
+        (timeouts, proxy errors, driver exceptions), they leave the flagged
+        visit streak alone.
+        """
+        if not os.path.exists(self.path):
+            return
+        state = self.load_state()
+        state.setdefault("launch_failures", 0)
+        state.setdefault("network_errors", 0)
+        if launch_failed:
+            state["launch_failures"] += 1
+        elif network_error:
+            state["visits"] += 1
+            state["launch_failures"] = 0
+            state["network_errors"] += 1
+        else:
+            state["visits"] += 1
+            state["launch_failures"] = 0
+            if success:
+                state["failures"] = 0
+                if driver:
+                    self.save_cookies(driver)
+            else:
+                state["failures"] += 1
+
+        # Chrome may still be running from this directory, so prepare() rotates on the next launch
+        if state["launch_failures"] >= MAX_LAUNCH_FAILURES:
+            state["rotate"] = {"reason": f"Chrome failed to start {state['launch_failures']} times in a row",
+                               "keep_cookies": True}
+        elif state["failures"] >= MAX_PROFILE_FAILURES:
+            state["rotate"] = {"reason": f"{state['failures']} failed visits in a row", "keep_cookies": False}
+        self.save_state(state)
+
+    def rotate(self, reason, keep_cookies=True):
+        print(f"Rotating Chrome profile {self.path} ({reason})")
+        cookies = None
+        if keep_cookies and os.path.exists(self.cookies_path):
+            with open(self.cookies_path, 'r') as f:
+                cookies = f.read()
+        try:
+            shutil.rmtree(self.path)
+        except OSError as e:
+            # e.g. files still held open on Windows, keep the mark so the next launch retries
+            print(f"Error removing Chrome profile, retrying on next launch: {e}")
+            if not os.path.exists(self.path):
+                os.makedirs(self.path)
+            if cookies and not os.path.exists(self.cookies_path):
+                with open(self.cookies_path, 'w') as f:
+                    f.write(cookies)
+            state = self.load_state()
+            state["rotate"] = {"reason": reason, "keep_cookies": keep_cookies}
+            self.save_state(state)
+            return False
+        if cookies:
+            os.makedirs(self.path)
+            with open(self.cookies_path, 'w') as f:
+                f.write(cookies)
+        return True
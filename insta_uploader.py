@@ -5,12 +5,18 @@ import time
 from datetime import datetime
 import moviepy.editor as mp
 from dotenv import load_dotenv
+from profiler import profiled
+from upload_queue import UploadQueue, video_created_time
 
 # Load environment variables
 load_dotenv()
 
 VIDEOS_DIR = os.getenv("VIDEOS_DIR", "videos")
 POSTED_URLS_FILE = os.getenv("POSTED_URLS_FILE", "posted_urls.json")
+UPLOAD_QUEUE_FILE = os.getenv("UPLOAD_QUEUE_FILE", "upload_queue.jsonl")
+# Uploads per session, the rest waits so the next scrape can queue fresh videos ahead of it
+UPLOAD_BATCH_SIZE = int(os.getenv("UPLOAD_BATCH_SIZE", "6"))
+UPLOAD_INTERVAL = 3600  # Seconds between consecutive uploads
 
 def load_posted_urls():
     if os.path.exists(POSTED_URLS_FILE):
@@ -71,6 +77,7 @@ def upload_single_video(cl, video_path, caption):
     
     return False
 
+@profiled("upload_to_instagram")
 def upload_to_instagram(username, password):
     if not username or not password:
         raise ValueError("Instagram credentials not provided!")
@@ -84,41 +91,56 @@ def upload_to_instagram(username, password):
         posted_data = load_posted_urls()
         posted_urls = posted_data["posted_urls"]
         
-        video_files = []
+        # Queue new files so the freshest clips go out first, even with a deep backlog
+        upload_queue = UploadQueue(UPLOAD_QUEUE_FILE)
         for file in os.listdir(VIDEOS_DIR):
-            if file.endswith('.mp4'):
+            if file.endswith('.mp4') and file not in posted_urls:
                 full_path = os.path.join(VIDEOS_DIR, file)
-                if file not in posted_urls:
-                    video_files.append(full_path)
+                video_id = os.path.splitext(file)[0]
+                upload_queue.push(file, video_created_time(video_id, full_path), {"path": full_path})
         
-        if not video_files:
+        if not len(upload_queue):
             print("No new videos to upload")
             return
         
-        total_videos = len(video_files)
-        print(f"\nFound {total_videos} new videos to upload")
+        total_videos = len(upload_queue)
+        batch_size = min(total_videos, UPLOAD_BATCH_SIZE)
+        print(f"\nFound {total_videos} new videos to upload, uploading up to {batch_size} this session")
         
-        for index, video_path in enumerate(video_files, 1):
+        uploads = 0
+        while uploads < UPLOAD_BATCH_SIZE:
+            item = upload_queue.pop()
+            if item is None:
+                break
+            video_path = item["data"]["path"]
+            if item["id"] in posted_urls or not os.path.exists(video_path):
+                upload_queue.ack(item["id"])
+                continue
+            
+            # Only wait once there is another video to upload
+            if uploads:
+                print(f"Waiting {UPLOAD_INTERVAL // 60} minutes before uploading next video...")
+                time.sleep(UPLOAD_INTERVAL)
+            uploads += 1
             try:
-                print(f"\nUploading video {index}/{total_videos}")
+                print(f"\nUploading video {uploads}/{batch_size}")
                 print(f"Video path: {video_path}")
                 
                 caption = f"🎥✨ #reels #trending #viral #music #cover"
                 
                 if upload_single_video(cl, video_path, caption):
-                    print(f"Upload successful for video {index}!")
+                    print(f"Upload successful for video {uploads}!")
                     posted_urls.append(os.path.basename(video_path))
                     save_posted_urls(posted_data)
+                    upload_queue.ack(item["id"])
                 else:
-                    print(f"Upload failed for video {index} after all retries!")
-                
-                if index < total_videos:
-                    print(f"Waiting 1 hour before uploading next video...")
-                    time.sleep(3600)
+                    print(f"Upload failed for video {uploads} after all retries!")
                 
             except Exception as e:
-                print(f"Error uploading video {index} ({video_path}): {e}")
+                print(f"Error uploading video {uploads} ({video_path}): {e}")
         
+        if len(upload_queue):
+            print(f"{len(upload_queue)} videos left for the next session")
         print("\nUpload session completed!")
         
     except Exception as e:
@@ -0,0 +1,211 @@
+import os
+import sys
+import time
+import signal
+import cProfile
+import pstats
+import threading
+import functools
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Comma separated stage names to profile on every run, e.g. "job" or "download_video,upload_to_instagram"
+PROFILE_STAGES = set(s.strip() for s in os.getenv("PROFILE_STAGES", "").split(',') if s.strip())
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sampling")  # "sampling" or "deterministic"
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join("config", "log"))
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.01"))
+TOP_ALLOCATIONS = int(os.getenv("PROFILE_TOP_ALLOCATIONS", "25"))
+SNAPSHOT_INTERVAL = float(os.getenv("PROFILE_SNAPSHOT_INTERVAL", "1.0"))
+SNAPSHOT_GROWTH = 1.1  # A new high this much above the last snapshot bypasses SNAPSHOT_INTERVAL
+# Keep the profiler's own bookkeeping out of the allocation report
+SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, threading.__file__),
+    tracemalloc.Filter(False, tracemalloc.__file__),
+]
+
+# Stages armed by SIGUSR1 for a single run
+armed_stages = set()
+active = threading.local()
+
+
+def arm_next_job(signum=None, frame=None):
+    print("Profiling armed for the next job run")
+    armed_stages.add("job")
+
+
+def install_signal_handler():
+    # SIGUSR1 doesn't exist on Windows, use PROFILE_STAGES there
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, arm_next_job)
+
+
+class StackSampler:
+    """Samples the call stack of one thread and counts collapsed stacks.
+
+    The output is in the folded format read by flamegraph.pl and speedscope:
+    one line per distinct stack, frames root first separated by ';', then the
+    number of samples.
+    """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class PeakSnapshotter:
+    """Keeps the tracemalloc snapshot taken when traced memory was highest.
+
+    A snapshot after the stage returns only shows what is still alive, so
+    this thread polls the traced size and snapshots every new high. It takes
+    at most one snapshot per SNAPSHOT_INTERVAL, unless memory grew by
+    SNAPSHOT_GROWTH since the last one.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.snapshot = None
+        self.snapshot_size = 0
+        self.snapshot_overhead = 0  # The kept snapshot is itself traced memory
+        self.last_snapshot_time = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def check(self):
+        current = tracemalloc.get_traced_memory()[0] - self.snapshot_overhead
+        if current <= self.snapshot_size:
+            return
+        now = time.time()
+        if current > self.snapshot_size * SNAPSHOT_GROWTH or now - self.last_snapshot_time >= SNAPSHOT_INTERVAL:
+            self.snapshot = None
+            before = tracemalloc.get_traced_memory()[0]
+            self.snapshot = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+            self.snapshot_overhead = tracemalloc.get_traced_memory()[0] - before
+            self.snapshot_size = current
+            self.last_snapshot_time = now
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.check()
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+def write_memory_report(path, snapshot, snapshot_size, peak, elapsed):
+    with open(path, 'w') as f:
+        f.write(f"Elapsed: {elapsed:.1f}s\n")
+        f.write(f"Peak traced memory: {peak / 1024 / 1024:.1f} MB\n")
+        f.write(f"Snapshot taken at: {snapshot_size / 1024 / 1024:.1f} MB\n\n")
+        f.write(f"Top {TOP_ALLOCATIONS} allocations by line at the snapshot:\n")
+        for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+            f.write(f"{stat}\n")
+
+
+def run_profiled(name, func, *args, **kwargs):
+    if not os.path.exists(PROFILE_DIR):
+        os.makedirs(PROFILE_DIR)
+    base_path = os.path.join(PROFILE_DIR, f"profile_{name}_{os.getpid()}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    print(f"Profiling {name} ({PROFILE_MODE}), output: {base_path}.*")
+
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+
+    snapshotter = PeakSnapshotter()
+    snapshotter.start()
+    profiler = None
+    sampler = None
+    if PROFILE_MODE == "deterministic":
+        profiler = cProfile.Profile()
+        profiler.enable()
+    else:
+        sampler = StackSampler(threading.get_ident())
+        sampler.start()
+
+    active.name = name
+    start_time = time.time()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        elapsed = time.time() - start_time
+        active.name = None
+        if profiler:
+            profiler.disable()
+        else:
+            sampler.stop()
+        snapshotter.stop()
+        try:
+            _, peak = tracemalloc.get_traced_memory()
+            if snapshotter.snapshot is None:
+                snapshotter.check()
+            if profiler:
+                profiler.dump_stats(base_path + ".prof")
+                with open(base_path + "_stats.txt", 'w') as f:
+                    stats = pstats.Stats(profiler, stream=f)
+                    stats.sort_stats('cumulative').print_stats(50)
+            else:
+                sampler.write(base_path + ".folded")
+            write_memory_report(base_path + "_memory.txt", snapshotter.snapshot, snapshotter.snapshot_size, peak, elapsed)
+        except Exception as e:
+            print(f"Error writing profile for {name}: {e}")
+        finally:
+            if started_tracemalloc:
+                tracemalloc.stop()
+        print(f"Profile of {name} written ({elapsed:.1f}s)")
+
+
+def profiled(name):
+    """Profile the decorated stage when it is listed in PROFILE_STAGES or armed by SIGUSR1.
+
+    When profiling is off the wrapper only does a set lookup before calling
+    through, so stages can stay decorated in production.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if name not in PROFILE_STAGES and name not in armed_stages:
+                return func(*args, **kwargs)
+            # Don't start a nested profiler inside an already profiled stage
+            if getattr(active, "name", None):
+                return func(*args, **kwargs)
+            armed_stages.discard(name)
+            return run_profiled(name, func, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Comma separated list of proxy URLs, e.g. "http://127.0.0.1:8081,socks5://10.0.0.2:1080".
+# If empty, endpoints are read from PROXY_POOL_FILE (one per line, '#' for comments).
+PROXY_POOL = os.getenv("PROXY_POOL", "")
+PROXY_POOL_FILE = os.getenv("PROXY_POOL_FILE", os.path.join("config", "proxies.txt"))
+# Shared by bot.py and bot2.py so both see the same health scores and spread over the pool together
+PROXY_HEALTH_FILE = os.getenv("PROXY_HEALTH_FILE", "proxy_health.json")
+LOCK_TIMEOUT = 10  # A lock file older than this was left behind by a crashed process
+QUARANTINE_SECONDS = int(os.getenv("PROXY_QUARANTINE_SECONDS", "1800"))
+# Compared against page load / extraction time, never against full download time
+SLOW_SECONDS = float(os.getenv("PROXY_SLOW_SECONDS", "60"))
+MAX_CONSECUTIVE_FAILURES = int(os.getenv("PROXY_MAX_FAILURES", "3"))
+MIN_SUCCESS_RATE = 0.3
+EWMA_ALPHA = 0.3  # Weight of the newest sample in the success/latency averages
+
+
+def load_proxy_endpoints():
+    if PROXY_POOL.strip():
+        return [p.strip() for p in PROXY_POOL.split(',') if p.strip()]
+
+    endpoints = []
+    if os.path.exists(PROXY_POOL_FILE):
+        with open(PROXY_POOL_FILE, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    endpoints.append(line)
+    return endpoints
+
+
+class ProxyPool:
+    """Pool of egress proxies with health scoring and sticky per-profile assignment.
+
+    Browser sessions use get(key), which keeps a profile on one endpoint.
+    Downloads use next(), which rotates over the whole pool. Every request
+    outcome is fed back through report(). Endpoints that keep failing, or
+    whose average latency goes above SLOW_SECONDS, are put in quarantine for
+    QUARANTINE_SECONDS. When the pool is empty or every endpoint is
+    quarantined, get() and next() return None and callers connect directly.
+
+    The health file is re-read under a lock file before every change and
+    replaced atomically, so several bots can share one pool.
+    """
+
+    def __init__(self, endpoints, health_file=PROXY_HEALTH_FILE):
+        self.endpoints = list(dict.fromkeys(endpoints))
+        self.health_file = health_file
+        self.lock = threading.Lock()
+        self.data = {}
+        self.health = {}
+        self.assignments = {}
+        self.next_index = 0
+        self._load()
+
+    def _default_health(self):
+        return {
+            "success_rate": 1.0,
+            "latency": 0.0,
+            "requests": 0,
+            "failures": 0,
+            "consecutive_failures": 0,
+            "quarantined_until": 0
+        }
+
+    @contextmanager
+    def _shared_state(self):
+        """Hold the thread lock and the health file lock, with the latest state loaded."""
+        with self.lock:
+            if not self.health_file:
+                yield
+                return
+            lock_path = self.health_file + ".lock"
+            deadline = time.time() + LOCK_TIMEOUT
+            while True:
+                try:
+                    fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                    os.close(fd)
+                    break
+                except FileExistsError:
+                    try:
+                        if time.time() - os.path.getmtime(lock_path) > LOCK_TIMEOUT:
+                            os.remove(lock_path)
+                            continue
+                    except OSError:
+                        continue
+                    if time.time() > deadline:
+                        print(f"Timed out waiting for {lock_path}, using cached proxy state")
+                        yield
+                        return
+                    time.sleep(0.05)
+            try:
+                self._load()
+                yield
+                self._save()
+            finally:
+                try:
+                    os.remove(lock_path)
+                except OSError:
+                    pass
+
+    def _load(self):
+        data = {}
+        if self.health_file and os.path.exists(self.health_file):
+            try:
+                with open(self.health_file, 'r') as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(f"Error loading proxy health file: {e}")
+        self.data = data
+        self.next_index = data.get("next_index", 0)
+
+        saved_health = data.get("health", {})
+        for endpoint in self.endpoints:
+            health = self._default_health()
+            health.update(saved_health.get(endpoint, {}))
+            self.health[endpoint] = health
+
+        # Kept as is, other bots sharing the file may use endpoints this process doesn't know
+        self.assignments = dict(data.get("assignments", {}))
+
+    def _save(self):
+        if not self.health_file:
+            return
+        health = dict(self.data.get("health", {}))
+        health.update(self.health)
+        temp_file = self.health_file + ".tmp"
+        try:
+            with open(temp_file, 'w') as f:
+                json.dump({"health": health, "assignments": self.assignments,
+                           "next_index": self.next_index}, f, indent=4)
+            os.replace(temp_file, self.health_file)
+        except Exception as e:
+            print(f"Error saving proxy health file: {e}")
+
+    def is_available(self, endpoint):
+        return endpoint in self.health and self.health[endpoint]["quarantined_until"] <= time.time()
+
+    def score(self, endpoint):
+        # Higher is better: reliable endpoints first, latency breaks ties
+        health = self.health[endpoint]
+        return health["success_rate"] / (1.0 + health["latency"] / SLOW_SECONDS)
+
+    def get(self, key):
+        """Return the proxy assigned to key, or None to connect directly."""
+        with self._shared_state():
+            current = self.assignments.get(key)
+            if current and self.is_available(current):
+                return current
+
+            available = [e for e in self.endpoints if self.is_available(e)]
+            if not available:
+                if self.endpoints:
+                    print("All proxies are quarantined, using direct connection")
+                return None
+
+            # Spread keys over the pool so each profile gets its own egress IP
+            load = {e: 0 for e in available}
+            for endpoint in self.assignments.values():
+                if endpoint in load:
+                    load[endpoint] += 1
+            best = min(available, key=lambda e: (load[e], -self.score(e)))
+
+            if current:
+                print(f"Reassigning {key} from quarantined proxy {current} to {best}")
+            self.assignments[key] = best
+            return best
+
+    def next(self):
+        """Return the next available proxy in turn, or None to connect directly.
+
+        Downloads aren't tied to a browser profile, so they rotate over the
+        whole pool instead of all going through one sticky endpoint.
+        """
+        with self._shared_state():
+            available = [e for e in self.endpoints if self.is_available(e)]
+            if not available:
+                return None
+            endpoint = available[self.next_index % len(available)]
+            self.next_index = (self.next_index + 1) % len(self.endpoints)
+            return endpoint
+
+    def report(self, endpoint, success, latency):
+        """Record the outcome of a request made through endpoint."""
+        if endpoint is None or endpoint not in self.health:
+            return
+
+        with self._shared_state():
+            health = self.health[endpoint]
+            health["requests"] += 1
+            health["success_rate"] = (1 - EWMA_ALPHA) * health["success_rate"] + EWMA_ALPHA * (1.0 if success else 0.0)
+            if success:
+                health["consecutive_failures"] = 0
+                if health["latency"]:
+                    health["latency"] = (1 - EWMA_ALPHA) * health["latency"] + EWMA_ALPHA * latency
+                else:
+                    health["latency"] = latency
+            else:
+                health["failures"] += 1
+                health["consecutive_failures"] += 1
+
+            reason = None
+            if health["consecutive_failures"] >= MAX_CONSECUTIVE_FAILURES:
+                reason = f"{health['consecutive_failures']} consecutive failures"
+            elif health["success_rate"] < MIN_SUCCESS_RATE:
+                reason = f"success rate {health['success_rate']:.2f}"
+            elif health["latency"] > SLOW_SECONDS:
+                reason = f"average latency {health['latency']:.1f}s"
+
+            if reason:
+                print(f"Quarantining proxy {endpoint} for {QUARANTINE_SECONDS}s ({reason})")
+                health["quarantined_until"] = time.time() + QUARANTINE_SECONDS
+                # Give the endpoint a clean slate once the quarantine expires
+                health["success_rate"] = MIN_SUCCESS_RATE + (1 - MIN_SUCCESS_RATE) / 2
+                health["latency"] = 0.0
+                health["consecutive_failures"] = 0
+
+
+def load_proxy_pool(health_file=PROXY_HEALTH_FILE):
+    endpoints = load_proxy_endpoints()
+    if endpoints:
+        print(f"Loaded {len(endpoints)} proxy endpoints")
+    return ProxyPool(endpoints, health_file=health_file)
@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Number of parallel range requests per file, 1 disables accelerated downloads
+DOWNLOAD_CONNECTIONS = int(os.getenv("DOWNLOAD_CONNECTIONS", "4"))
+MIN_SEGMENT_SIZE = 1024 * 1024  # Files smaller than two segments use one connection
+SEGMENT_RETRIES = 3
+RANGE_ATTEMPTS = 2  # Later attempts resume the segments that failed before falling back to yt-dlp
+DOWNLOAD_TIMEOUT = 30
+CHUNK_SIZE = 256 * 1024
+STATE_SAVE_INTERVAL = 4 * 1024 * 1024  # Bytes written between progress saves
+SUPPORTED_PROXY_SCHEMES = ('http://', 'https://')  # What urllib's ProxyHandler can carry
+
+
+def build_opener(proxy=None):
+    handlers = []
+    if proxy:
+        handlers.append(urllib.request.ProxyHandler({'http': proxy, 'https': proxy}))
+    return urllib.request.build_opener(*handlers)
+
+
+def probe_file(opener, url, headers):
+    """Return (size, supports_ranges) for url using a one byte range request."""
+    request = urllib.request.Request(url, headers={**headers, 'Range': 'bytes=0-0'})
+    with opener.open(request, timeout=DOWNLOAD_TIMEOUT) as response:
+        content_range = response.headers.get('Content-Range', '')
+        if response.status == 206 and '/' in content_range:
+            total = content_range.rsplit('/', 1)[1]
+            if total.isdigit():
+                return int(total), True
+        length = response.headers.get('Content-Length')
+        return (int(length) if length and length.isdigit() else None), False
+
+
+def split_segments(size, connections):
+    connections = max(1, min(connections, size // MIN_SEGMENT_SIZE))
+    segment_size = size // connections
+    segments = []
+    for i in range(connections):
+        start = i * segment_size
+        end = size - 1 if i == connections - 1 else start + segment_size - 1
+        segments.append({"start": start, "end": end, "done": 0})
+    return segments
+
+
+class RangeDownload:
+    """Download of a single file over several parallel HTTP range requests.
+
+    Data is written in place into `<output>.ranges.part` and per-segment
+    progress is kept next to it in a .json file, so a retry or a run after a
+    crash resumes from where each segment stopped. The .part file is renamed
+    to the output path once every segment is complete.
+    """
+
+    def __init__(self, url, output_path, headers=None, proxy=None, connections=DOWNLOAD_CONNECTIONS):
+        self.url = url
+        self.output_path = output_path
+        self.part_path = output_path + '.ranges.part'  # Not yt-dlp's .part, which it would try to continue
+        self.state_path = self.part_path + '.json'
+        self.headers = dict(headers or {})
+        self.connections = connections
+        self.opener = build_opener(proxy)
+        self.lock = threading.Lock()
+        self.segments = []
+        self.unsaved_bytes = 0
+
+    def load_state(self, size):
+        if os.path.exists(self.state_path) and os.path.exists(self.part_path):
+            try:
+                with open(self.state_path, 'r') as f:
+                    state = json.load(f)
+                if state.get("size") == size:
+                    print(f"Resuming partial download: {self.part_path}")
+                    return state["segments"]
+            except Exception as e:
+                print(f"Error loading download state, starting over: {e}")
+
+        with open(self.part_path, 'wb') as f:
+            f.truncate(size)
+        return split_segments(size, self.connections)
+
+    def cleanup(self):
+        for path in (self.part_path, self.state_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def save_state(self, size):
+        with open(self.state_path, 'w') as f:
+            json.dump({"size": size, "segments": self.segments}, f)
+
+    def download_segment(self, segment, size):
+        for attempt in range(SEGMENT_RETRIES):
+            start = segment["start"] + segment["done"]
+            if start > segment["end"]:
+                return True
+            try:
+                headers = {**self.headers, 'Range': f'bytes={start}-{segment["end"]}'}
+                request = urllib.request.Request(self.url, headers=headers)
+                with self.opener.open(request, timeout=DOWNLOAD_TIMEOUT) as response, \
+                        open(self.part_path, 'r+b', buffering=0) as f:
+                    if response.status != 206:
+                        raise Exception(f"Server ignored range request (HTTP {response.status})")
+                    f.seek(start)
+                    while True:
+                        remaining = segment["end"] + 1 - (segment["start"] + segment["done"])
+                        if remaining <= 0:
+                            break
+                        chunk = response.read(min(CHUNK_SIZE, remaining))
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                        with self.lock:
+                            segment["done"] += len(chunk)
+                            self.unsaved_bytes += len(chunk)
+                            if self.unsaved_bytes >= STATE_SAVE_INTERVAL:
+                                self.save_state(size)
+                                self.unsaved_bytes = 0
+                if segment["start"] + segment["done"] > segment["end"]:
+                    return True
+                raise Exception("Connection closed before end of segment")
+            except Exception as e:
+                print(f"Segment {segment['start']}-{segment['end']} failed (try {attempt + 1}/{SEGMENT_RETRIES}): {e}")
+                time.sleep(2 ** attempt)
+        return False
+
+    def run(self):
+        size, supports_ranges = probe_file(self.opener, self.url, self.headers)
+        if not size or not supports_ranges:
+            print("Server does not support range requests")
+            return False
+
+        self.segments = self.load_state(size)
+        resumed = sum(segment["done"] for segment in self.segments)
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=len(self.segments)) as executor:
+            results = list(executor.map(lambda s: self.download_segment(s, size), self.segments))
+
+        self.save_state(size)
+        if not all(results):
+            print(f"Download incomplete, {sum(not r for r in results)} segments failed: {self.part_path}")
+            return False
+
+        os.replace(self.part_path, self.output_path)
+        os.remove(self.state_path)
+        elapsed = time.time() - start_time
+        # Only bytes fetched in this run count toward throughput, resumed ones were fetched earlier
+        downloaded = size - resumed
+        print(f"Downloaded {downloaded / 1024 / 1024:.1f} MB over {len(self.segments)} connections "
+              f"in {elapsed:.1f}s ({downloaded / 1024 / 1024 / max(elapsed, 0.001):.1f} MB/s)"
+              + (f", {resumed / 1024 / 1024:.1f} MB resumed from an earlier attempt" if resumed else ""))
+        return True
+
+
+def download_file(url, output_path, headers=None, proxy=None, connections=DOWNLOAD_CONNECTIONS):
+    """Range download url, resuming up to RANGE_ATTEMPTS times.
+
+    On failure the partial file is removed, since the caller falls back to a
+    full download and would never resume it.
+    """
+    download = RangeDownload(url, output_path, headers, proxy, connections)
+    for attempt in range(RANGE_ATTEMPTS):
+        try:
+            if download.run():
+                return True
+        except Exception as e:
+            print(f"Error during range download of {url} (try {attempt + 1}/{RANGE_ATTEMPTS}): {e}")
+    download.cleanup()
+    return False
+
+
+def accelerated_download(ydl, info, proxy=None):
+    """Download an extracted video with parallel range requests.
+
+    info is the result of ydl.extract_info(url, download=False), so a caller
+    falling back to yt-dlp can pass it to ydl.process_ie_result() without
+    hitting TikTok a second time.
+
+    Returns False when the selected format can't be fetched this way (merged
+    formats, HLS/DASH, servers without range support, proxies urllib can't
+    use such as socks5://) so the caller can fall back to a regular yt-dlp
+    download.
+    """
+    if DOWNLOAD_CONNECTIONS <= 1:
+        return False
+    # Never bypass the assigned proxy by going out over the direct connection
+    if proxy and not proxy.startswith(SUPPORTED_PROXY_SCHEMES):
+        return False
+
+    if info.get('requested_formats') or info.get('protocol') not in ('http', 'https') or not info.get('url'):
+        return False
+
+    headers = dict(info.get('http_headers') or {})
+    try:
+        cookie_header = ydl.cookiejar.get_cookie_header(info['url'])
+        if cookie_header:
+            headers['Cookie'] = cookie_header
+    except Exception:
+        pass
+
+    output_path = ydl.prepare_filename(info)
+    if os.path.exists(output_path):
+        print(f"Already downloaded: {output_path}")
+        RangeDownload(info['url'], output_path).cleanup()
+        return True
+    return download_file(info['url'], output_path, headers=headers, proxy=proxy)
+
+
+def benchmark(file_size_mb=64, connections=(1, 2, 4, 8), bandwidth_mb=8):
+    """Compare connection counts against a local server with per-connection bandwidth limit."""
+    import tempfile
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    payload = os.urandom(file_size_mb * 1024 * 1024)
+
+    class RangeHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            start, end = 0, len(payload) - 1
+            range_header = self.headers.get('Range')
+            if range_header:
+                first, last = range_header.replace('bytes=', '').split('-')
+                start, end = int(first), int(last) if last else end
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{len(payload)}')
+            else:
+                self.send_response(200)
+            self.send_header('Content-Length', str(end - start + 1))
+            self.end_headers()
+            # Throttle each connection like a rate-limited CDN edge
+            for offset in range(start, end + 1, CHUNK_SIZE):
+                self.wfile.write(payload[offset:min(offset + CHUNK_SIZE, end + 1)])
+                time.sleep(CHUNK_SIZE / (bandwidth_mb * 1024 * 1024))
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/video.mp4'
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for count in connections:
+                output_path = os.path.join(tmp, f'video_{count}.mp4')
+                start_time = time.time()
+                ok = download_file(url, output_path, connections=count)
+                elapsed = time.time() - start_time
+                intact = False
+                if ok:
+                    with open(output_path, 'rb') as f:
+                        intact = f.read() == payload
+                print(f"{count} connections: {elapsed:.2f}s, intact={intact}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import heapq
+import itertools
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# "newest", "oldest" or "deadline"
+UPLOAD_QUEUE_POLICY = os.getenv("UPLOAD_QUEUE_POLICY", "newest")
+DEADLINE_HOURS = float(os.getenv("UPLOAD_DEADLINE_HOURS", "24"))
+COMPACT_MIN_ENTRIES = 100
+
+
+def tiktok_timestamp(video_id):
+    """Post time encoded in the upper 32 bits of a TikTok video ID, or None."""
+    try:
+        timestamp = int(video_id) >> 32
+    except (TypeError, ValueError):
+        return None
+    # Reject IDs that don't decode to a plausible time
+    return timestamp if 1400000000 < timestamp < time.time() + 86400 else None
+
+
+def video_created_time(video_id, path=None):
+    created = tiktok_timestamp(video_id)
+    if created is None and path and os.path.exists(path):
+        created = os.path.getmtime(path)
+    return created if created is not None else time.time()
+
+
+def get_priority(item, policy, now):
+    """Heap key for item, smaller pops first.
+
+    The first element is a tier: with the "deadline" policy items still
+    younger than DEADLINE_HOURS are drained earliest-deadline-first, and items
+    that already missed it drop to a second tier ordered newest first.
+    """
+    created = item["created"]
+
+    if policy == "oldest":
+        return (0, created)
+    if policy == "deadline":
+        deadline = created + DEADLINE_HOURS * 3600
+        if deadline > now:
+            return (0, deadline)
+        return (1, -created)
+    return (0, -created)
+
+
+class UploadQueue:
+    """Persistent priority queue of pending uploads.
+
+    Items live in a binary heap, so push and pop are O(log n). Every change
+    is appended to a JSON lines journal, which is replayed on startup and
+    compacted once it holds mostly popped entries, so the queue survives
+    restarts without rewriting the whole backlog on each operation.
+
+    pop() only hands an item out. It stays in the journal until ack() is
+    called after a successful upload, so failed or interrupted uploads come
+    back on the next start. Pushing a popped, unacked item puts it back in
+    the heap.
+    """
+
+    def __init__(self, journal_file, policy=UPLOAD_QUEUE_POLICY):
+        self.journal_file = journal_file
+        self.policy = policy
+        self.items = {}
+        self.pending = {}  # Popped but not acked, still in the journal
+        self.heap = []
+        self.counter = itertools.count()
+        self.journal_entries = 0
+        self.load()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item_id):
+        return item_id in self.items
+
+    def load(self):
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash mid-write
+                        continue
+                    self.journal_entries += 1
+                    if entry["op"] == "push":
+                        self.items[entry["item"]["id"]] = entry["item"]
+                    else:
+                        self.items.pop(entry["id"], None)
+
+        now = time.time()
+        self.heap = [(get_priority(item, self.policy, now), next(self.counter), item_id)
+                     for item_id, item in self.items.items()]
+        heapq.heapify(self.heap)
+
+        self.compact_if_needed()
+
+    def compact_if_needed(self):
+        if self.journal_entries > max(COMPACT_MIN_ENTRIES, 2 * (len(self.items) + len(self.pending))):
+            self.compact()
+
+    def append_journal(self, entry):
+        with open(self.journal_file, 'a') as f:
+            f.write(json.dumps(entry) + "\n")
+        self.journal_entries += 1
+
+    def compact(self):
+        temp_file = self.journal_file + ".tmp"
+        with open(temp_file, 'w') as f:
+            for item in list(self.items.values()) + list(self.pending.values()):
+                f.write(json.dumps({"op": "push", "item": item}) + "\n")
+        os.replace(temp_file, self.journal_file)
+        self.journal_entries = len(self.items) + len(self.pending)
+
+    def push(self, item_id, created=None, data=None):
+        """Queue an upload, returns False if item_id is already queued."""
+        if item_id in self.items:
+            return False
+        if item_id in self.pending:
+            # Still journaled, just make it available again
+            item = self.pending.pop(item_id)
+            self.items[item_id] = item
+            heapq.heappush(self.heap, (get_priority(item, self.policy, time.time()), next(self.counter), item_id))
+            return True
+        item = {
+            "id": item_id,
+            "created": created if created is not None else time.time(),
+            "data": data or {}
+        }
+        self.items[item_id] = item
+        heapq.heappush(self.heap, (get_priority(item, self.policy, time.time()), next(self.counter), item_id))
+        self.append_journal({"op": "push", "item": item})
+        return True
+
+    def pop(self):
+        """Hand out the highest priority item, or None when empty. Call ack() once it's done."""
+        now = time.time()
+        while self.heap:
+            priority, _, item_id = heapq.heappop(self.heap)
+            item = self.items.get(item_id)
+            if item is None:
+                continue
+            # Priorities can only get worse with age, re-file items that changed tier
+            current = get_priority(item, self.policy, now)
+            if current > priority:
+                heapq.heappush(self.heap, (current, next(self.counter), item_id))
+                continue
+            self.pending[item_id] = self.items.pop(item_id)
+            return item
+        return None
+
+    def ack(self, item_id):
+        """Remove a popped item for good, e.g. after it was uploaded."""
+        if self.pending.pop(item_id, None) is None:
+            return
+        self.append_journal({"op": "pop", "id": item_id})
+        self.compact_if_needed()
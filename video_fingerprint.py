@@ -0,0 +1,224 @@
+import os
+import json
+import shutil
+import numpy as np
+import moviepy.editor as mp
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+FRAME_SAMPLES = 5  # Keyframes sampled at evenly spaced positions in the clip
+FRAME_DISTANCE = int(os.getenv("FINGERPRINT_FRAME_DISTANCE", "6"))  # Max differing bits out of 64
+MIN_MATCHING_FRAMES = 3
+AUDIO_DISTANCE = int(os.getenv("FINGERPRINT_AUDIO_DISTANCE", "14"))
+AUDIO_SECONDS = 30
+AUDIO_FPS = 8000
+AUDIO_WINDOWS = 17  # 16 frame-to-frame differences x 4 band differences = 64 bits
+AUDIO_BANDS = 5
+DUPLICATES_DIR = "duplicates"  # Subfolder of the videos dir that uploaders don't scan
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def bits_to_int(bits):
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bool(bit))
+    return value
+
+
+def dhash(frame):
+    """64 bit difference hash of an RGB frame."""
+    gray = frame.mean(axis=2)
+    small = np.array([
+        [block.mean() for block in np.array_split(band, 9, axis=1)]
+        for band in np.array_split(gray, 8, axis=0)
+    ])
+    return bits_to_int((small[:, 1:] > small[:, :-1]).flatten())
+
+
+def compute_frame_hashes(clip):
+    duration = clip.duration or 0
+    positions = [duration * (i + 1) / (FRAME_SAMPLES + 1) for i in range(FRAME_SAMPLES)]
+    return [dhash(clip.get_frame(t)) for t in positions]
+
+
+def compute_audio_hash(clip):
+    """64 bit hash of how band energies change over time in the first seconds of audio."""
+    if clip.audio is None:
+        return None
+
+    audio = clip.audio.subclip(0, min(AUDIO_SECONDS, clip.duration))
+    samples = audio.to_soundarray(fps=AUDIO_FPS)
+    if samples.ndim > 1:
+        samples = samples.mean(axis=1)
+    if len(samples) < AUDIO_WINDOWS * 64:
+        return None
+
+    # Log spaced bands between 100 Hz and Nyquist
+    edges = np.geomspace(100, AUDIO_FPS / 2, AUDIO_BANDS + 1)
+    energies = []
+    for window in np.array_split(samples, AUDIO_WINDOWS):
+        spectrum = np.abs(np.fft.rfft(window)) ** 2
+        freqs = np.fft.rfftfreq(len(window), 1 / AUDIO_FPS)
+        energies.append([
+            spectrum[(freqs >= low) & (freqs < high)].sum()
+            for low, high in zip(edges[:-1], edges[1:])
+        ])
+
+    energies = np.array(energies)
+    band_diffs = energies[:, :-1] - energies[:, 1:]
+    return bits_to_int((band_diffs[1:] - band_diffs[:-1] > 0).flatten())
+
+
+def fingerprint_video(video_path):
+    video = mp.VideoFileClip(video_path)
+    try:
+        return {
+            "frames": compute_frame_hashes(video),
+            "audio": compute_audio_hash(video)
+        }
+    finally:
+        video.close()
+
+
+class BKTree:
+    """Burkhard-Keller tree over 64 bit hashes for Hamming range queries.
+
+    A query only descends into children whose edge distance is within
+    max_distance of the query's distance to the node, so lookups touch a
+    small part of the tree instead of every stored hash.
+    """
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, value, item):
+        if self.root is None:
+            self.root = (value, [item], {})
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, [item], {})
+                return
+            node = child
+
+    def search(self, value, max_distance):
+        results = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node_value, items, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= max_distance:
+                results.extend((distance, item) for item in items)
+            for edge, child in children.items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        return results
+
+
+class FingerprintIndex:
+    """Persistent index of video fingerprints used to skip near-duplicate clips.
+
+    Frame hashes of every known video go into a BK-tree. A new video is a
+    duplicate of an indexed one when at least MIN_MATCHING_FRAMES of its
+    sampled frames are within FRAME_DISTANCE of the frame at the same position
+    in that video, and the audio hashes are within AUDIO_DISTANCE. When either
+    video has no audio, every sampled frame has to match.
+    """
+
+    def __init__(self, index_file):
+        self.index_file = index_file
+        self.videos = {}
+        self.duplicates = {}
+        self.tree = BKTree()
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r') as f:
+                    data = json.load(f)
+                self.videos = data.get("videos", {})
+                self.duplicates = data.get("duplicates", {})
+            except Exception as e:
+                print(f"Error loading fingerprint index: {e}")
+        for key, fingerprint in self.videos.items():
+            for frame_hash in fingerprint["frames"]:
+                self.tree.add(frame_hash, key)
+
+    def save(self):
+        with open(self.index_file, 'w') as f:
+            json.dump({"videos": self.videos, "duplicates": self.duplicates}, f, indent=4)
+
+    def find_duplicate(self, fingerprint):
+        frames = fingerprint["frames"]
+        candidates = set()
+        for frame_hash in frames:
+            candidates.update(key for _, key in self.tree.search(frame_hash, FRAME_DISTANCE))
+
+        best_key, best_count = None, 0
+        for key in candidates:
+            indexed = self.videos[key]
+            # Compare frames at the same positions, so clips that share a set and
+            # framing but show it in a different order don't match
+            count = sum(hamming(a, b) <= FRAME_DISTANCE for a, b in zip(frames, indexed["frames"]))
+            audio = indexed.get("audio")
+            if audio is None or fingerprint["audio"] is None:
+                is_match = count == len(frames) == len(indexed["frames"])
+            else:
+                is_match = count >= MIN_MATCHING_FRAMES and hamming(audio, fingerprint["audio"]) <= AUDIO_DISTANCE
+            if is_match and count > best_count:
+                best_key, best_count = key, count
+        return best_key
+
+    def add(self, key, fingerprint):
+        self.videos[key] = fingerprint
+        for frame_hash in fingerprint["frames"]:
+            self.tree.add(frame_hash, key)
+        self.save()
+
+    def check_duplicate(self, key, video_path):
+        """Return the key of the video that video_path duplicates, or None.
+
+        Videos that aren't duplicates are added to the index. Fingerprinting
+        errors never block a video, they are reported and treated as unique.
+        """
+        if key in self.duplicates:
+            return self.duplicates[key]
+        if key in self.videos:
+            return None
+
+        try:
+            fingerprint = fingerprint_video(video_path)
+        except Exception as e:
+            print(f"Error fingerprinting {video_path}: {e}")
+            return None
+
+        original = self.find_duplicate(fingerprint)
+        if original:
+            self.duplicates[key] = original
+            self.save()
+            return original
+
+        self.add(key, fingerprint)
+        return None
+
+
+def set_aside_duplicate(video_path):
+    """Move a duplicate out of the upload folder, keeping it in case the match was wrong."""
+    duplicates_dir = os.path.join(os.path.dirname(video_path), DUPLICATES_DIR)
+    if not os.path.exists(duplicates_dir):
+        os.makedirs(duplicates_dir)
+    target = os.path.join(duplicates_dir, os.path.basename(video_path))
+    shutil.move(video_path, target)
+    return target